@@ -1,7 +1,17 @@
+import array
+import copy
+import hashlib
 import logging
+import mmap
+import os
+import pickle
 import re
+import tempfile
+from collections import OrderedDict
 from pprint import pprint
 
+import numpy as np
+
 import regnault_validator
 
 # Configuration du logging
@@ -15,12 +25,155 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Marqueur des lignes d'injection de vapeur, analysées par découpage à position fixe
+_MARQUEUR_INJECTION = 'Injection de vapeur('
+# Marqueurs recherchés directement dans les octets du fichier (latin-1 : un octet par caractère)
+_MARQUEUR_INJECTION_OCTETS = _MARQUEUR_INJECTION.encode('latin-1')
+# "stérilisation" et "Dévaporisation" peuvent avoir des encodages différents
+_MARQUEURS_REGNAULT = ('Palier de st', 'vaporisation')
+_MARQUEURS_REGNAULT_OCTETS = tuple(marqueur.encode('latin-1') for marqueur in _MARQUEURS_REGNAULT)
+# Octets qui terminent une ligne pour str.splitlines() une fois décodés en latin-1
+# ('\r' seul est déjà traduit en '\n', et '\r\n' compte pour une seule fin de ligne)
+_FINS_DE_LIGNE_SPLITLINES = b'\n\x0b\x0c\x1c\x1d\x1e\x85'
+# Expressions régulières compilées une seule fois au chargement du module
+_RE_HORO = re.compile(r'(\d{2}:\d{2}:\d{2})')
+# '\r' non suivi de '\n' : fin de ligne "Mac" que le balayage par octets ne gère pas tel quel
+_RE_CR_ISOLE = re.compile(rb'\r(?!\n)')
 
-def analyser_cycle_complet_grs(chemin_fichier: str) -> dict:
+# Cache des analyses : en mémoire (LRU) et sur disque (un fichier .pkl par clé).
+# Les .pkl ne sont écrits que par ce programme et sont chargés avec pickle, qui peut
+# exécuter du code : REPERTOIRE_CACHE doit rester un répertoire de confiance.
+REPERTOIRE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+TAILLE_CACHE_MEMOIRE = 32
+# Au-delà, les .pkl les moins récemment utilisés sont supprimés du disque
+TAILLE_CACHE_DISQUE = 256
+_cache_analyses: OrderedDict[str, dict] = OrderedDict()
+
+
+def _empreinte_parseur() -> str:
     """
-    Analyse le fichier .grs en deux passes :
-    1. Lit les données du cycle ligne par ligne pour trouver les phases de vide.
-    2. Lit les données de résumé (#) pour les températures min/max.
+    Empreinte du code source de ce module, intégrée aux clés de cache : toute
+    modification du parseur (ou du reste du module) invalide les analyses en cache.
+    """
+    with open(__file__, 'rb') as f_source:
+        return hashlib.blake2b(f_source.read(), digest_size=8).hexdigest()
+
+
+_VERSION_CACHE = _empreinte_parseur()
+
+
+def convertir_phases(
+    temperatures_brutes: list[int], pressions_brutes: list[int]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convertit les mesures brutes des phases de vide et évalue leur conformité
+    (pression <= 18 kPa), en une opération vectorisée.
+
+    Args:
+        temperatures_brutes: Les températures en dixièmes de °C.
+        pressions_brutes: Les pressions en dixièmes de kPa.
+
+    Returns:
+        Un tuple (températures en °C, pressions en kPa, conformité) de tableaux NumPy.
+    """
+    temperatures_brutes = np.asarray(temperatures_brutes, dtype=np.int32)
+    pressions_brutes = np.asarray(pressions_brutes, dtype=np.int32)
+
+    temperatures = temperatures_brutes / 10.0
+    pressions = pressions_brutes / 10.0
+    return temperatures, pressions, pressions <= 18.0
+
+
+def _bornes_ligne(mm: mmap.mmap | bytes, position: int) -> tuple[int, int]:
+    """Retourne les positions de début et de fin de la ligne contenant `position`."""
+    debut = mm.rfind(b'\n', 0, position) + 1
+    fin = mm.find(b'\n', position)
+    if fin < 0:
+        fin = len(mm)
+    return debut, fin
+
+
+def _lignes_contenant(mm: mmap.mmap | bytes, motif: bytes):
+    """Génère les bornes (début, fin) de chaque ligne contenant `motif`, une seule fois par ligne."""
+    position = mm.find(motif)
+    while position >= 0:
+        debut, fin = _bornes_ligne(mm, position)
+        yield debut, fin
+        position = mm.find(motif, fin)
+
+
+def _lignes_resume(mm: mmap.mmap | bytes):
+    """
+    Génère les bornes (position du '#', fin) de chaque ligne de résumé, c'est-à-dire
+    dont le premier caractère non blanc est '#'.
+    """
+    position = mm.find(b'#')
+    while position >= 0:
+        debut, fin = _bornes_ligne(mm, position)
+        if not _decoder_ligne(mm, debut, position).strip():
+            yield position, fin
+        position = mm.find(b'#', fin)
+
+
+def _decoder_ligne(mm: mmap.mmap | bytes, debut: int, fin: int) -> str:
+    """Décode une seule ligne du fichier ('latin-1', plus sûr pour les fichiers d'équipements)."""
+    return mm[debut:fin].decode('latin-1').rstrip()
+
+
+def _extraire_phase(ligne_str: str) -> tuple[str, int, int] | None:
+    """
+    Extrait l'horodatage et les mesures brutes d'une ligne "Injection de vapeur".
+
+    Args:
+        ligne_str: La ligne du fichier .grs.
+
+    Returns:
+        Un tuple (horodatage, température en dixièmes de °C, pression en dixièmes de kPa),
+        ou None si la ligne ne correspond pas au format attendu.
+    """
+    position = ligne_str.find(_MARQUEUR_INJECTION)
+    if position < 0:
+        return None
+
+    accolade = ligne_str.find('{', 0, position)
+    if accolade < 0:
+        return None
+
+    # Format fixe "Injection de vapeur(TTTT[PPPP" : 3 ou 4 chiffres par mesure
+    debut_temperature = position + len(_MARQUEUR_INJECTION)
+    crochet = ligne_str.find('[', debut_temperature, debut_temperature + 5)
+    if crochet < 0:
+        return None
+    temperature_str = ligne_str[debut_temperature:crochet]
+    if len(temperature_str) < 3 or not temperature_str.isdecimal():
+        return None
+
+    pression_str = ligne_str[crochet + 1:crochet + 5]
+    if not pression_str[3:].isdecimal():
+        pression_str = pression_str[:3]
+    if len(pression_str) < 3 or not pression_str.isdecimal():
+        return None
+
+    partie_evenement = ligne_str[accolade + 1:].lstrip()
+
+    horodatage = ""
+    match_horodatage = _RE_HORO.match(partie_evenement)
+    if match_horodatage:
+        horodatage = match_horodatage.group(1)
+
+    return horodatage, int(temperature_str), int(pression_str)
+
+
+def _analyser_fichier_grs(chemin_fichier: str) -> dict:
+    """
+    Analyse le fichier .grs projeté en mémoire (mmap), en ne décodant que les
+    lignes utiles, repérées directement dans les octets (fins de ligne LF, CRLF
+    ou CR, comme en mode texte) :
+    - les lignes "Injection de vapeur" donnent les phases de vide ;
+    - les lignes de résumé (#) donnent les températures min/max ;
+    - les lignes "Palier de stérilisation" / "Dévaporisation" sont conservées
+      pour la validation de Régnault, numérotées selon str.splitlines() comme dans
+      regnault_validator.validate_grs_file_content.
 
     Args:
         chemin_fichier: Le chemin vers le fichier .grs.
@@ -29,66 +182,74 @@ def analyser_cycle_complet_grs(chemin_fichier: str) -> dict:
         Un dictionnaire contenant toutes les données nécessaires à la validation.
     """
     donnees: dict = {
-        "phases_de_vide": [],
-        "phases_de_vide_kPa": []
+        # Tableau contigu de doubles : exploitable sans copie via np.frombuffer
+        "phases_de_vide_kPa": array.array('d'),
+        "lignes_regnault": []
     }
+    donnees_resume = {}
+    horodatages = []
+    temperatures_brutes = []
+    pressions_brutes = []
 
     try:
-        # Utiliser 'latin-1' est souvent plus sûr pour les fichiers générés par des équipements
-        with open(chemin_fichier, 'r', encoding='latin-1') as f_in:
-            lignes_brutes = f_in.readlines()
-        
-        lignes = [ligne.strip() for ligne in lignes_brutes]
+        with open(chemin_fichier, 'rb') as f_in:
+            # mmap refuse les fichiers vides
+            if os.fstat(f_in.fileno()).st_size:
+                with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    tampon = mm
+                    # Le balayage repère les lignes par '\n' : comme le mode texte, on
+                    # traduit les fins de ligne '\r' isolées (cas rare, au prix d'une copie)
+                    if _RE_CR_ISOLE.search(mm):
+                        tampon = mm[:].replace(b'\r\n', b'\n').replace(b'\r', b'\n')
 
-        # --- PASSE 1: Analyse du détail du cycle pour les vides ---
-        for ligne_str in lignes:
-            if 'Injection de vapeur' not in ligne_str:
-                continue
+                    # --- Résumé : températures min/max ---
+                    for debut, fin in _lignes_resume(tampon):
+                        # Format "#<numéro> <valeur>" : découpage sans expression régulière
+                        corps = _decoder_ligne(tampon, debut + 1, fin)
+                        i = 0
+                        while i < len(corps) and corps[i].isdigit():
+                            i += 1
+                        if i:
+                            donnees_resume[corps[:i]] = corps[i:].strip()
 
-            if '{' not in ligne_str:
-                continue
+                    # --- Détail du cycle : phases de vide ---
+                    for debut, fin in _lignes_contenant(tampon, _MARQUEUR_INJECTION_OCTETS):
+                        phase = _extraire_phase(_decoder_ligne(tampon, debut, fin))
+                        if phase is None:
+                            continue
+                        horodatage, temperature_brute, pression_brute = phase
+                        horodatages.append(horodatage)
+                        temperatures_brutes.append(temperature_brute)
+                        pressions_brutes.append(pression_brute)
 
-            _, _, suffixe = ligne_str.partition('{')
-            partie_evenement = suffixe.strip()
+                    # --- Lignes candidates pour la validation de Régnault ---
+                    lignes_candidates = {}
+                    for motif in _MARQUEURS_REGNAULT_OCTETS:
+                        lignes_candidates.update(_lignes_contenant(tampon, motif))
 
-            match_mesures = re.search(r'Injection de vapeur\((\d{3,4})\[(\d{3,4})', partie_evenement)
-            if not match_mesures:
-                continue
+                    # Numérotation selon str.splitlines(), comme validate_grs_file_content :
+                    # on ne compte les fins de ligne qu'entre deux candidates
+                    numero_ligne, position = 1, 0
+                    for debut, fin in sorted(lignes_candidates.items()):
+                        segment = tampon[position:debut]
+                        numero_ligne += len(segment) - len(segment.translate(None, _FINS_DE_LIGNE_SPLITLINES))
+                        position = debut
+                        # '\x0b', '\x0c', '\x85'... découpent aussi la ligne pour splitlines()
+                        morceaux = tampon[debut:fin].decode('latin-1').splitlines()
+                        for decalage, morceau in enumerate(morceaux):
+                            if any(marqueur in morceau for marqueur in _MARQUEURS_REGNAULT):
+                                donnees["lignes_regnault"].append((numero_ligne + decalage, morceau))
 
-            temperature_str, pression_str = match_mesures.groups()
+        temperatures, pressions, conformes = convertir_phases(temperatures_brutes, pressions_brutes)
+        # Phases de vide en colonnes parallèles (une entrée par phase)
+        donnees["phases_de_vide"] = {
+            "horodatages": horodatages,
+            "temperatures_C": temperatures,
+            "pressions_kPa": pressions,
+            "conformes": conformes
+        }
+        donnees["phases_de_vide_kPa"].frombytes(pressions[conformes].tobytes())
 
-            try:
-                temperature_phase = float(temperature_str) / 10.0
-                pression_vide = float(pression_str) / 10.0
-            except ValueError:
-                continue
-
-            horodatage = ""
-            match_horodatage = re.match(r'(\d{2}:\d{2}:\d{2})', partie_evenement)
-            if match_horodatage:
-                horodatage = match_horodatage.group(1)
-
-            phase_info = {
-                "horodatage": horodatage,
-                "temperature_C": temperature_phase,
-                "pression_kPa": pression_vide,
-                "conforme": pression_vide <= 18.0
-            }
-
-            donnees["phases_de_vide"].append(phase_info)
-
-            if phase_info["conforme"]:
-                donnees["phases_de_vide_kPa"].append(pression_vide)
-
-        # --- PASSE 2: Analyse du résumé pour les températures ---
-        donnees_resume = {}
-        for ligne_str in lignes:
-            if ligne_str.startswith('#'):
-                match = re.search(r'^#(\d+)\s*(.*)', ligne_str)
-                if match:
-                    cle, valeur = match.group(1), match.group(2).strip()
-                    donnees_resume[cle] = valeur
-        
         if '40' in donnees_resume:
             donnees['temp_min_C'] = float(donnees_resume['40']) / 10.0
         if '41' in donnees_resume:
@@ -100,8 +261,129 @@ def analyser_cycle_complet_grs(chemin_fichier: str) -> dict:
         
     return donnees
 
-def valider_donnees_completes(donnees: dict):
-    """Affiche les résultats de la validation basée sur les règles complètes."""
+
+def _cle_cache(chemin_fichier: str) -> str:
+    """
+    Calcule la clé de cache d'un fichier .grs à partir de son chemin, de sa taille
+    et de sa date de modification, sans relire son contenu.
+
+    Raises:
+        FileNotFoundError: Si le fichier n'existe pas.
+    """
+    stat = os.stat(chemin_fichier)
+    identite = f"{_VERSION_CACHE}|{os.path.realpath(chemin_fichier)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.blake2b(identite.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _charger_cache(chemin_cache: str) -> dict | None:
+    """Charge une analyse depuis le cache disque, ou retourne None si elle est absente ou illisible."""
+    try:
+        with open(chemin_cache, 'rb') as f_cache:
+            donnees = pickle.load(f_cache)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # fichier tronqué, corrompu ou écrit par une autre version
+        logger.debug(f"Cache '{chemin_cache}' ignoré: {e}")
+        return None
+
+    # La date de modification sert d'ordre LRU pour l'élagage du cache disque
+    try:
+        os.utime(chemin_cache)
+    except OSError:
+        pass
+    return donnees
+
+
+def _ecrire_cache(chemin_cache: str, donnees: dict):
+    """
+    Écrit une analyse dans le cache disque de façon atomique : le .pkl est d'abord
+    écrit dans un fichier temporaire de REPERTOIRE_CACHE, puis renommé.
+    """
+    chemin_temporaire = None
+    try:
+        os.makedirs(REPERTOIRE_CACHE, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            'wb', dir=REPERTOIRE_CACHE, suffix='.tmp', delete=False
+        ) as f_cache:
+            chemin_temporaire = f_cache.name
+            pickle.dump(donnees, f_cache, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(chemin_temporaire, chemin_cache)
+        chemin_temporaire = None
+    except (OSError, pickle.PicklingError) as e:
+        logger.warning(f"Impossible d'écrire le cache '{chemin_cache}': {e}")
+    finally:
+        if chemin_temporaire is not None:
+            try:
+                os.remove(chemin_temporaire)
+            except OSError:
+                pass
+
+    _elaguer_cache_disque()
+
+
+def _elaguer_cache_disque():
+    """Supprime les .pkl les moins récemment utilisés au-delà de TAILLE_CACHE_DISQUE."""
+    try:
+        entrees = [
+            entree for entree in os.scandir(REPERTOIRE_CACHE)
+            if entree.name.endswith('.pkl') and entree.is_file()
+        ]
+        if len(entrees) <= TAILLE_CACHE_DISQUE:
+            return
+        entrees.sort(key=lambda entree: entree.stat().st_mtime_ns)
+        for entree in entrees[:len(entrees) - TAILLE_CACHE_DISQUE]:
+            os.remove(entree.path)
+    except OSError as e:  # fichier supprimé entre-temps par une autre exécution
+        logger.debug(f"Élagage du cache '{REPERTOIRE_CACHE}' interrompu: {e}")
+
+
+def analyser_cycle_complet_grs(chemin_fichier: str) -> dict:
+    """
+    Analyse le fichier .grs, en réutilisant le résultat d'une analyse précédente
+    (en mémoire ou dans REPERTOIRE_CACHE) si ni le fichier ni ce module n'ont été
+    modifiés depuis.
+
+    Args:
+        chemin_fichier: Le chemin vers le fichier .grs.
+
+    Returns:
+        Un dictionnaire contenant toutes les données nécessaires à la validation.
+        C'est une copie : le modifier n'affecte pas le cache.
+    """
+    try:
+        cle = _cle_cache(chemin_fichier)
+    except FileNotFoundError:
+        logger.error(f"Fichier introuvable à '{chemin_fichier}'")
+        return {}
+
+    if cle in _cache_analyses:
+        _cache_analyses.move_to_end(cle)
+        return copy.deepcopy(_cache_analyses[cle])
+
+    chemin_cache = os.path.join(REPERTOIRE_CACHE, f"{cle}.pkl")
+    donnees = _charger_cache(chemin_cache)
+    if donnees is not None:
+        logger.debug(f"Analyse de '{chemin_fichier}' chargée depuis le cache")
+    else:
+        donnees = _analyser_fichier_grs(chemin_fichier)
+        if not donnees:
+            return donnees
+        _ecrire_cache(chemin_cache, donnees)
+
+    _cache_analyses[cle] = donnees
+    if len(_cache_analyses) > TAILLE_CACHE_MEMOIRE:
+        _cache_analyses.popitem(last=False)
+    return copy.deepcopy(donnees)
+
+def valider_donnees_completes(donnees: dict, verbose: bool = True):
+    """
+    Affiche les résultats de la validation basée sur les règles complètes.
+
+    Args:
+        donnees: Les données extraites par `analyser_cycle_complet_grs`.
+        verbose: Si False, le détail des phases et des lignes de Régnault n'est
+            journalisé que pour une règle non conforme.
+    """
     print("\n" + "="*50)
     print("          VALIDATION COMPLÈTE DU CYCLE")
     print("="*50 + "\n")
@@ -128,25 +410,29 @@ def valider_donnees_completes(donnees: dict):
 
     # --- Règle 2: Validation des phases de vide ---
     logger.info("\n--- 2. Validation des Phases de Vide ---")
-    if 'phases_de_vide' in donnees and donnees['phases_de_vide']:
+    if 'phases_de_vide' in donnees and donnees['phases_de_vide']['horodatages']:
         phases = donnees['phases_de_vide']
-        phases_conformes = [phase for phase in phases if phase['conforme']]
+        conformes = phases['conformes']
 
-        nombre_phases = len(phases_conformes)
+        nombre_phases = int(conformes.sum())
         is_nombre_ok = nombre_phases >= 8
         logger.info(f"  - Nombre de phases de vide conformes >= 8 : {'✅ OK' if is_nombre_ok else '❌ NON CONFORME'} (trouvé: {nombre_phases})")
 
         is_pressions_ok = is_nombre_ok
         logger.info(f"  - Pression <= 18 kPa sur au moins 8 phases : {'✅ OK' if is_pressions_ok else '❌ NON CONFORME'}")
 
-        logger.info("  - Détail des phases d'injection :")
-        for i, phase in enumerate(phases, 1):
-            statut = "CONFORME" if phase['conforme'] else "NON CONFORME"
-            horodatage = phase['horodatage'] or '-'
-            logger.info(
-                f"    Phase {i:02d} ({horodatage}) : "
-                f"{phase['temperature_C']:.1f} °C / {phase['pression_kPa']:.1f} kPa -> {statut}"
-            )
+        # Le détail n'est construit que si un handler consomme le niveau INFO
+        if (verbose or not is_nombre_ok) and logger.isEnabledFor(logging.INFO):
+            logger.info("  - Détail des phases d'injection :")
+            for i, horodatage in enumerate(phases['horodatages']):
+                logger.info(
+                    "    Phase %02d (%s) : %.1f °C / %.1f kPa -> %s",
+                    i + 1,
+                    horodatage or '-',
+                    phases['temperatures_C'][i],
+                    phases['pressions_kPa'][i],
+                    "CONFORME" if conformes[i] else "NON CONFORME"
+                )
 
         if not is_nombre_ok or not is_pressions_ok:
             validation_globale_ok = False
@@ -157,31 +443,33 @@ def valider_donnees_completes(donnees: dict):
     # --- Règle 3: Validation Pression/Température (Régnault) ---
     logger.info("\n--- 3. Validation Pression/Température (Régnault) ---")
     try:
-        with open(fichier_grs, 'r', encoding='latin-1') as f_in:
-            file_content = f_in.read()
-        
-        regnault_results = regnault_validator.validate_grs_file_content(file_content)
+        regnault_results = regnault_validator.validate_grs_file_content_lines(
+            donnees.get('lignes_regnault', [])
+        )
         
         if not regnault_results:
             logger.warning("  - ⚠️ Aucune ligne de 'Palier de stérilisation' ou 'Dévaporisation' trouvée.")
             validation_globale_ok = False
         else:
-            regnault_conforme = True
-            for result in regnault_results:
-                if result['status'] != "Conforme":
-                    regnault_conforme = False
-                
-                logger.info(
-                    f"  - Ligne {result['line_number']} ({result['line_name']}): "
-                    f"T={result['temperature']}°C, P={result['pressure']}kPa -> "
-                    f"Statut: {result['status']}. "
-                    f"(Attendu: {result['expected_range']} kPa)"
-                )
+            # all() s'arrête à la première ligne non conforme
+            regnault_conforme = all(result.get('status') == "Conforme" for result in regnault_results)
+
+            if verbose or not regnault_conforme:
+                for result in regnault_results:
+                    logger.info(
+                        "  - Ligne %s (%s): T=%s°C, P=%skPa -> Statut: %s. (Attendu: %s kPa)",
+                        result['line_number'],
+                        result['line_name'],
+                        result['temperature'],
+                        result['pressure'],
+                        result['status'],
+                        result['expected_range']
+                    )
             
             if not regnault_conforme:
                 validation_globale_ok = False
     except Exception as e:
-        logger.error(f"  - ⚠️ Erreur lors de la lecture du fichier GRS: {e}")
+        logger.error(f"  - ⚠️ Erreur lors de la validation de Régnault: {e}")
         validation_globale_ok = False
 
 
@@ -3,6 +3,8 @@
 Module pour la validation des cycles d'autoclave par rapport à la table de Régnault.
 """
 
+import numpy as np
+
 # Table de Régnault pour les températures de 134°C à 137°C.
 # Les clés sont les températures entières en °C.
 # Les valeurs sont des listes de tuples (pression_min, pression_max) pour chaque dixième de degré.
@@ -27,6 +29,24 @@ REGNAULT_TABLE = {
     ]
 }
 
+# Version aplatie de la table : l'index (température en dixièmes - 1340) donne
+# directement les bornes de pression pour chaque dixième de degré (134.0 à 137.0).
+_REGNAULT_TEMP_MIN_TENTHS = min(REGNAULT_TABLE) * 10
+_MINS = np.array(
+    [p_min for temp in sorted(REGNAULT_TABLE) for p_min, _ in REGNAULT_TABLE[temp]],
+    dtype=np.float64
+)
+_MAXS = np.array(
+    [p_max for temp in sorted(REGNAULT_TABLE) for _, p_max in REGNAULT_TABLE[temp]],
+    dtype=np.float64
+)
+_REGNAULT_SIZE = len(_MINS)
+# Les mêmes bornes en dixièmes de kPa, pour comparer directement les valeurs du fichier
+_MINS_TENTHS = np.rint(_MINS * 10).astype(np.int32)
+_MAXS_TENTHS = np.rint(_MAXS * 10).astype(np.int32)
+# Au-delà, une valeur (champ corrompu) est validée hors du lot vectorisé
+_BATCH_TENTHS_LIMIT = np.iinfo(np.int32).max
+
 def check_pressure_conformity(temperature: float, pressure: float) -> tuple[str, tuple[float, float] | None]:
     """
     Vérifie si une pression donnée est conforme pour une température donnée
@@ -47,17 +67,60 @@ def check_pressure_conformity(temperature: float, pressure: float) -> tuple[str,
     if temp_int not in REGNAULT_TABLE:
         return "Température hors table", None
 
-    pressure_ranges = REGNAULT_TABLE[temp_int]
-    if temp_dec_index >= len(pressure_ranges):
+    if temp_dec_index >= len(REGNAULT_TABLE[temp_int]):
         return "Décimale de température hors table", None
 
-    min_pressure, max_pressure = pressure_ranges[temp_dec_index]
+    idx = temp_int * 10 + temp_dec_index - _REGNAULT_TEMP_MIN_TENTHS
+
+    min_pressure = float(_MINS[idx])
+    max_pressure = float(_MAXS[idx])
 
     if min_pressure <= pressure <= max_pressure:
         return "Conforme", (min_pressure, max_pressure)
     else:
         return "Non Conforme", (min_pressure, max_pressure)
 
+def _check_pressure_conformity_batch(
+    temperatures_tenths: list[int], pressures_tenths: list[int]
+) -> list[tuple[str, tuple[float, float] | None]]:
+    """
+    Équivalent vectorisé de `check_pressure_conformity` pour une série de mesures
+    exprimées en dixièmes, telles qu'elles figurent dans le fichier GRS.
+
+    Args:
+        temperatures_tenths: Les températures en dixièmes de °C, en valeur absolue
+            inférieures ou égales à _BATCH_TENTHS_LIMIT.
+        pressures_tenths: Les pressions en dixièmes de kPa, dans le même ordre et
+            avec la même limite.
+
+    Returns:
+        Une liste de tuples (statut, plage de pression attendue), un par mesure.
+    """
+    if not temperatures_tenths:
+        return []
+
+    # int64 : aucun débordement pour des valeurs bornées par _BATCH_TENTHS_LIMIT
+    temps = np.asarray(temperatures_tenths, dtype=np.int64)
+    press = np.asarray(pressures_tenths, dtype=np.int64)
+
+    idx = temps - _REGNAULT_TEMP_MIN_TENTHS
+    in_table = (idx >= 0) & (idx < _REGNAULT_SIZE)
+    safe_idx = idx.clip(0, _REGNAULT_SIZE - 1)
+    conforme = in_table & (press >= _MINS_TENTHS[safe_idx]) & (press <= _MAXS_TENTHS[safe_idx])
+    mins = _MINS[safe_idx]
+    maxs = _MAXS[safe_idx]
+    known_degree = np.isin(temps // 10, list(REGNAULT_TABLE))
+
+    return [
+        (
+            ("Conforme" if ok else "Non Conforme", (p_min, p_max)) if valid
+            else ("Décimale de température hors table" if known else "Température hors table", None)
+        )
+        for ok, valid, known, p_min, p_max in zip(
+            conforme.tolist(), in_table.tolist(), known_degree.tolist(), mins.tolist(), maxs.tolist()
+        )
+    ]
+
 def validate_grs_file_content(file_content: str) -> list[dict]:
     """
     Analyse le contenu d'un fichier GRS et valide les lignes de stérilisation
@@ -66,45 +129,97 @@ def validate_grs_file_content(file_content: str) -> list[dict]:
     Args:
         file_content: Le contenu du fichier GRS sous forme de chaîne de caractères.
 
+    Returns:
+        Une liste de dictionnaires, chacun représentant le résultat de la validation
+        pour une ligne pertinente.
+    """
+    lines = [
+        (i, line)
+        for i, line in enumerate(file_content.splitlines(), 1)
+        # "stérilisation" et "Dévaporisation" peuvent avoir des encodages différents
+        if "Palier de st" in line or "vaporisation" in line
+    ]
+    return validate_grs_file_content_lines(lines)
+
+def validate_grs_file_content_lines(lines: list[tuple[int, str]]) -> list[dict]:
+    """
+    Valide des lignes de stérilisation et de dévaporisation déjà extraites
+    d'un fichier GRS.
+
+    Args:
+        lines: Une liste de tuples (numéro de ligne, ligne), numérotés à partir de 1.
+
     Returns:
         Une liste de dictionnaires, chacun représentant le résultat de la validation
         pour une ligne pertinente.
     """
     results = []
-    lines = file_content.splitlines()
-    for i, line in enumerate(lines):
+    # Positions dans `results` des lignes correctement lues, validées en bloc ensuite
+    positions = []
+    temperatures_tenths = []
+    pressures_tenths = []
+    for line_number, line in lines:
         # "stérilisation" et "Dévaporisation" peuvent avoir des encodages différents
-        if "Palier de st" in line or "vaporisation" in line:
+        is_palier = "Palier de st" in line
+        is_devap = not is_palier and "vaporisation" in line
+        if not (is_palier or is_devap):
+            continue
+
+        line_name = "Palier de stérilisation" if is_palier else "Dévaporisation"
+        try:
+            # Seuls les champs 0 (température) et 2 (pression) avant l'événement sont utiles
+            head, _, _ = line.partition('{')
+            data = head.split(';', 3)
+            
+            # Les valeurs sont mises à l'échelle par 10 dans le fichier
             try:
-                parts = line.split('{')
-                data = parts[0].split(';')
-                
-                # Les valeurs sont mises à l'échelle par 10 dans le fichier
-                temperature = float(data[0]) / 10.0
-                pressure = float(data[2]) / 10.0
-                
-                line_name = "Inconnu"
-                if "Palier de st" in line:
-                    line_name = "Palier de stérilisation"
-                elif "vaporisation" in line:
-                    line_name = "Dévaporisation"
-
-                status, pressure_range = check_pressure_conformity(temperature, pressure)
-                
-                results.append({
-                    "line_number": i + 1,
-                    "line_name": line_name,
-                    "temperature": temperature,
-                    "pressure": pressure,
-                    "expected_range": pressure_range,
-                    "status": status
-                })
-            except (IndexError, ValueError) as e:
-                results.append({
-                    "line_number": i + 1,
-                    "line_name": "Erreur de parsing",
-                    "error": str(e),
-                    "original_line": line
-                })
+                temp_tenths = int(data[0])
+                press_tenths = int(data[2])
+            except ValueError:
+                # Valeurs non entières (ex. "3100.5") : acceptées comme nombres décimaux
+                temp_tenths = float(data[0])
+                press_tenths = float(data[2])
+
+            result = {
+                "line_number": line_number,
+                "line_name": line_name,
+                "temperature": temp_tenths / 10.0,
+                "pressure": press_tenths / 10.0,
+                "temperature_tenths": temp_tenths,
+                "pressure_tenths": press_tenths
+            }
+
+            # Cas courant (entiers de taille raisonnable) : validation en bloc plus bas.
+            # Sinon, validation immédiate sur les valeurs en °C / kPa.
+            in_batch = (
+                isinstance(temp_tenths, int) and isinstance(press_tenths, int)
+                and abs(temp_tenths) <= _BATCH_TENTHS_LIMIT
+                and abs(press_tenths) <= _BATCH_TENTHS_LIMIT
+            )
+            if not in_batch:
+                status, pressure_range = check_pressure_conformity(
+                    result["temperature"], result["pressure"]
+                )
+                result["expected_range"] = pressure_range
+                result["status"] = status
+        except (IndexError, ValueError) as e:
+            results.append({
+                "line_number": line_number,
+                "line_name": "Erreur de parsing",
+                "error": str(e),
+                "original_line": line
+            })
+            continue
+
+        if in_batch:
+            positions.append(len(results))
+            temperatures_tenths.append(temp_tenths)
+            pressures_tenths.append(press_tenths)
+        results.append(result)
+
+    conformities = _check_pressure_conformity_batch(temperatures_tenths, pressures_tenths)
+    for position, (status, pressure_range) in zip(positions, conformities):
+        results[position]["expected_range"] = pressure_range
+        results[position]["status"] = status
 
     return results